@@ -0,0 +1,169 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Any, Awaitable, Dict, Mapping, Optional, TypeVar
+
+from langchain_core.runnables import RunnableConfig
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Number of runs whose call accounting is kept in memory
+MAX_TRACKED_RUNS = 1000
+
+# Seconds to wait after a run aborts before finishing its accounting, so the calls
+# cancelled alongside the first one, e.g. in parallel branches, are included
+ABORTED_RUN_GRACE_SECONDS = 1.0
+
+
+@dataclass
+class RunAccounting:
+    """Counts of the model and search calls of a single run, by node."""
+
+    started: Dict[str, int] = field(default_factory=dict)
+    completed: Dict[str, int] = field(default_factory=dict)
+    cancelled: Dict[str, int] = field(default_factory=dict)
+    # Calls that were never started because the run was already over
+    skipped: Dict[str, int] = field(default_factory=dict)
+
+    def record(self, status: str, node: str, count: int = 1) -> None:
+        """Add count calls of the node to the given status."""
+        calls = getattr(self, status)
+        calls[node] = calls.get(node, 0) + count
+
+
+_run_accounting: "OrderedDict[str, RunAccounting]" = OrderedDict()
+# Runs whose accounting is about to be finished after an abort
+_aborting_runs: set[str] = set()
+
+
+def create_run_id(config: RunnableConfig) -> str:
+    """Get the id of a new run, as set by the LangGraph server or a fresh one."""
+    metadata = config.get("metadata") or {}
+    return str(metadata.get("run_id") or uuid.uuid4())
+
+
+def get_run_id(state: Mapping[str, Any]) -> str:
+    """Get the id of the run from the graph state."""
+    run_id = state.get("run_id")
+    if not run_id:
+        raise ValueError("The state has no run_id, it is set by generate_query")
+    return run_id
+
+
+def get_run_accounting(run_id: str) -> RunAccounting:
+    """Get the call accounting of a run, creating it on first use."""
+    if run_id not in _run_accounting:
+        _run_accounting[run_id] = RunAccounting()
+        if len(_run_accounting) > MAX_TRACKED_RUNS:
+            _run_accounting.popitem(last=False)
+    return _run_accounting[run_id]
+
+
+def finish_run_accounting(
+    run_id: str, outcome: str = "finished"
+) -> Dict[str, Dict[str, int]]:
+    """Log and return the call accounting of a run that is over, and stop tracking it.
+
+    The accounting is logged as a structured record, with the run id, outcome and
+    accounting both in the message and as extra fields of the log record.
+    """
+    _aborting_runs.discard(run_id)
+    summary = asdict(_run_accounting.pop(run_id, RunAccounting()))
+    logger.info(
+        "Run %s %s, calls by node: %s",
+        run_id,
+        outcome,
+        json.dumps(summary, sort_keys=True),
+        extra={"run_id": run_id, "run_outcome": outcome, "call_accounting": summary},
+    )
+    return summary
+
+
+def abort_run_accounting(run_id: str) -> None:
+    """Finish the call accounting of a run that was cancelled or timed out.
+
+    Such runs never reach finalize_answer, so their accounting is finished here,
+    after a short grace period for the calls aborted alongside.
+    """
+    if run_id in _aborting_runs:
+        return
+
+    def finish() -> None:
+        # The run may have been finished in the meantime
+        if run_id in _aborting_runs:
+            finish_run_accounting(run_id, "aborted")
+
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        finish_run_accounting(run_id, "aborted")
+        return
+    _aborting_runs.add(run_id)
+    loop.call_later(ABORTED_RUN_GRACE_SECONDS, finish)
+
+
+def get_run_deadline(timeout_seconds: Optional[float]) -> Optional[float]:
+    """Get the wall-clock deadline of a run starting now, None if it has no timeout."""
+    if not timeout_seconds:
+        return None
+    return time.time() + timeout_seconds
+
+
+def check_deadline(
+    deadline: Optional[float], run_id: str, node: str, pending: int = 1
+) -> None:
+    """Raise a TimeoutError before starting calls of a run whose deadline has passed.
+
+    The pending calls that won't be started are recorded as skipped.
+    """
+    if deadline is None or time.time() < deadline:
+        return
+    get_run_accounting(run_id).record("skipped", node, pending)
+    logger.info(
+        "Run %s deadline exceeded, skipped %d %s call(s)", run_id, pending, node
+    )
+    abort_run_accounting(run_id)
+    raise TimeoutError(f"Run {run_id} exceeded its deadline before {node}")
+
+
+async def cancellable(
+    call: Awaitable[T],
+    run_id: str,
+    node: str,
+    deadline: Optional[float],
+    aborts_run: bool = True,
+) -> T:
+    """Await a model or search call, aborting it when the run is cancelled or times out.
+
+    Cancelling the run cancels the task awaiting the call, which closes the underlying
+    request; the deadline is enforced the same way. Either is recorded in the run's
+    accounting before the error is re-raised, and the run's accounting is finished
+    unless the call was cancelled on its own (aborts_run=False), e.g. a discarded
+    speculative answer.
+    """
+    accounting = get_run_accounting(run_id)
+    accounting.record("started", node)
+    try:
+        async with asyncio.timeout_at(_to_loop_time(deadline)):
+            result = await call
+    except (asyncio.CancelledError, TimeoutError):
+        accounting.record("cancelled", node)
+        logger.info("Run %s cancelled an in-flight %s call", run_id, node)
+        if aborts_run:
+            abort_run_accounting(run_id)
+        raise
+    accounting.record("completed", node)
+    return result
+
+
+def _to_loop_time(deadline: Optional[float]) -> Optional[float]:
+    """Convert a wall-clock deadline to the event loop's clock."""
+    if deadline is None:
+        return None
+    return asyncio.get_running_loop().time() + deadline - time.time()
@@ -1,6 +1,6 @@
 import os
 from pydantic import BaseModel, Field
-from typing import Any, Optional
+from typing import Any, Literal, Optional
 
 from langchain_core.runnables import RunnableConfig
 
@@ -39,6 +39,48 @@ class Configuration(BaseModel):
         metadata={"description": "The maximum number of research loops to perform."},
     )
 
+    max_research_topic_tokens: int = Field(
+        default=2000,
+        metadata={
+            "description": "The approximate token budget for the conversation context sent to the models."
+        },
+    )
+
+    research_topic_recent_messages: int = Field(
+        default=4,
+        metadata={
+            "description": "The number of most recent messages kept verbatim, older ones are summarized."
+        },
+    )
+
+    context_cache: Literal["none", "gemini", "local"] = Field(
+        default="none",
+        metadata={
+            "description": "Cache the research context shared by the last reflection and the final answer: 'none', 'gemini' (cached content API) or 'local' (in-process stub). Earlier reflection loops are not cached explicitly, as their context is read only once."
+        },
+    )
+
+    context_cache_ttl_seconds: int = Field(
+        default=600,
+        metadata={
+            "description": "The time to live of the cached research context in seconds."
+        },
+    )
+
+    run_timeout_seconds: Optional[float] = Field(
+        default=None,
+        metadata={
+            "description": "The deadline of a run in seconds, in-flight model and search calls are cancelled once it passes."
+        },
+    )
+
+    speculative_finalize: bool = Field(
+        default=False,
+        metadata={
+            "description": "Generate the final answer concurrently with reflection, discarding it if more research is needed."
+        },
+    )
+
     @classmethod
     def from_runnable_config(
         cls, config: Optional[RunnableConfig] = None
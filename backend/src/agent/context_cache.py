@@ -0,0 +1,130 @@
+import time
+import uuid
+from typing import Any, Dict, Optional, Tuple
+
+from google.genai import Client, errors, types
+
+
+class GeminiContextCache:
+    """Context cache backed by the Gemini cached content API.
+
+    The accumulated research context is uploaded once per run and referenced by the
+    reflection and finalize_answer calls, so its tokens are only processed once.
+    """
+
+    def __init__(self, client: Client):
+        self.client = client
+
+    async def create(self, model: str, context: str, ttl_seconds: int) -> Optional[str]:
+        """Cache the context for the given model and return the cache name.
+
+        Returns None if the context can't be cached, e.g. because it is below the
+        minimum number of tokens the model accepts for caching.
+        """
+        try:
+            cache = await self.client.aio.caches.create(
+                model=model,
+                config=types.CreateCachedContentConfig(
+                    contents=[context],
+                    display_name="research-context",
+                    ttl=f"{ttl_seconds}s",
+                ),
+            )
+        except errors.APIError:
+            return None
+        return cache.name
+
+    async def generate(
+        self, model: str, cache_name: str, contents: str, config: Dict[str, Any]
+    ) -> types.GenerateContentResponse:
+        """Generate content for the prompt following the cached context."""
+        return await self.client.aio.models.generate_content(
+            model=model,
+            contents=contents,
+            config={**config, "cached_content": cache_name},
+        )
+
+    async def delete(self, cache_name: str) -> None:
+        """Delete the cached context, it expires on its own if this fails."""
+        try:
+            await self.client.aio.caches.delete(name=cache_name)
+        except errors.APIError:
+            pass
+
+
+class LocalContextCache:
+    """In-process stand-in for GeminiContextCache, e.g. for testing.
+
+    Keeps the cached context in memory and sends it along with every request, so the
+    caching flow can be exercised with any model and without cached content quota.
+    Like Gemini caches, stored contexts expire after their time to live.
+    """
+
+    def __init__(self, client: Client):
+        self.client = client
+        # cache name -> (model, context, expiry time)
+        self.contexts: Dict[str, Tuple[str, str, float]] = {}
+
+    async def create(self, model: str, context: str, ttl_seconds: int) -> Optional[str]:
+        """Store the context for the given model and return the cache name."""
+        self.remove_expired()
+        cache_name = f"local/{uuid.uuid4().hex}"
+        self.contexts[cache_name] = (model, context, time.monotonic() + ttl_seconds)
+        return cache_name
+
+    async def generate(
+        self, model: str, cache_name: str, contents: str, config: Dict[str, Any]
+    ) -> types.GenerateContentResponse:
+        """Generate content for the stored context followed by the prompt."""
+        self.remove_expired()
+        if cache_name not in self.contexts:
+            raise ValueError(f"Context cache {cache_name} doesn't exist or expired")
+        cached_model, context, _ = self.contexts[cache_name]
+        if cached_model != model:
+            raise ValueError(
+                f"Context cache {cache_name} was created for {cached_model}, not {model}"
+            )
+        return await self.client.aio.models.generate_content(
+            model=model,
+            contents=context + contents,
+            config=config,
+        )
+
+    async def delete(self, cache_name: str) -> None:
+        """Drop the stored context."""
+        self.contexts.pop(cache_name, None)
+
+    def remove_expired(self) -> None:
+        """Drop the stored contexts whose time to live has passed."""
+        now = time.monotonic()
+        for cache_name, (_, _, expires_at) in list(self.contexts.items()):
+            if expires_at <= now:
+                del self.contexts[cache_name]
+
+
+async def refresh_context_cache(
+    context_cache: GeminiContextCache | LocalContextCache,
+    cache_name: Optional[str],
+    cached_summary_count: Optional[int],
+    model: str,
+    context: str,
+    summary_count: int,
+    ttl_seconds: int,
+) -> Tuple[Optional[str], int]:
+    """Make sure the research context with summary_count summaries is cached.
+
+    The existing cache is reused if it already holds the same summaries, otherwise it
+    is replaced by a new one. Creating a cache processes the whole context at the full
+    input price and adds storage cost, so callers should only cache a context that is
+    read more than once.
+
+    Returns:
+        tuple: The name of the cache (None if the context couldn't be cached) and the
+               number of summaries it holds.
+    """
+    if cache_name and cached_summary_count == summary_count:
+        return cache_name, summary_count
+    if cache_name:
+        await context_cache.delete(cache_name)
+    new_cache_name = await context_cache.create(model, context, ttl_seconds)
+    return new_cache_name, summary_count if new_cache_name else 0
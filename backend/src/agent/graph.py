@@ -1,8 +1,10 @@
 import os
+from typing import Tuple
 
 from agent.tools_and_schemas import SearchQueryList, Reflection
 from dotenv import load_dotenv
 from langchain_core.messages import AIMessage
+from langgraph.constants import TAG_NOSTREAM
 from langgraph.types import Send
 from langgraph.graph import StateGraph
 from langgraph.graph import START, END
@@ -15,20 +17,41 @@ from agent.state import (
     ReflectionState,
     WebSearchState,
 )
+from agent.cancellation import (
+    cancellable,
+    check_deadline,
+    create_run_id,
+    finish_run_accounting,
+    get_run_deadline,
+    get_run_id,
+)
 from agent.configuration import Configuration
+from agent.context_cache import (
+    GeminiContextCache,
+    LocalContextCache,
+    refresh_context_cache,
+)
+from agent.speculation import (
+    commit_speculative_answer,
+    discard_speculative_answer,
+    start_speculative_answer,
+)
 from agent.prompts import (
     get_current_date,
     query_writer_instructions,
     web_searcher_instructions,
+    research_context_prompt,
     reflection_instructions,
     answer_instructions,
 )
 from langchain_google_genai import ChatGoogleGenerativeAI
 from agent.utils import (
+    CHARS_PER_TOKEN,
     get_citations,
     get_research_topic,
     insert_citation_markers,
     resolve_urls,
+    update_research_topic,
 )
 
 load_dotenv()
@@ -39,9 +62,17 @@ if os.getenv("GEMINI_API_KEY") is None:
 # Used for Google Search API
 genai_client = Client(api_key=os.getenv("GEMINI_API_KEY"))
 
+# Opt-in caches for the research context shared by reflection and finalize_answer
+context_caches = {
+    "gemini": GeminiContextCache(genai_client),
+    "local": LocalContextCache(genai_client),
+}
+
 
 # Nodes
-def generate_query(state: OverallState, config: RunnableConfig) -> QueryGenerationState:
+async def generate_query(
+    state: OverallState, config: RunnableConfig
+) -> QueryGenerationState:
     """LangGraph node that generates a search queries based on the User's question.
 
     Uses Gemini 2.0 Flash to create an optimized search query for web research based on
@@ -55,6 +86,8 @@ def generate_query(state: OverallState, config: RunnableConfig) -> QueryGenerati
         Dictionary with state update, including search_query key containing the generated query
     """
     configurable = Configuration.from_runnable_config(config)
+    run_id = create_run_id(config)
+    run_deadline = get_run_deadline(configurable.run_timeout_seconds)
 
     # check for custom initial search query count
     if state.get("initial_search_query_count") is None:
@@ -69,30 +102,66 @@ def generate_query(state: OverallState, config: RunnableConfig) -> QueryGenerati
     )
     structured_llm = llm.with_structured_output(SearchQueryList)
 
+    # Build the bounded research topic once per run, reusing the summary of older turns
+    topic_update = update_research_topic(
+        state["messages"],
+        conversation_summary=state.get("conversation_summary"),
+        summarized_message_count=state.get("summarized_message_count"),
+        summarized_message_fingerprint=state.get("summarized_message_fingerprint"),
+        max_tokens=configurable.max_research_topic_tokens,
+        recent_messages=configurable.research_topic_recent_messages,
+    )
+
     # Format the prompt
     current_date = get_current_date()
     formatted_prompt = query_writer_instructions.format(
         current_date=current_date,
-        research_topic=get_research_topic(state["messages"]),
+        research_topic=topic_update["research_topic"],
         number_queries=state["initial_search_query_count"],
     )
     # Generate the search queries
-    result = structured_llm.invoke(formatted_prompt)
-    return {"query_list": result.query}
+    result = await cancellable(
+        structured_llm.ainvoke(formatted_prompt),
+        run_id,
+        "generate_query",
+        run_deadline,
+    )
+    return {
+        "query_list": result.query,
+        "run_id": run_id,
+        "run_deadline": run_deadline,
+        "speculation": None,
+        **topic_update,
+    }
 
 
-def continue_to_web_research(state: QueryGenerationState):
+def continue_to_web_research(state: QueryGenerationState, config: RunnableConfig):
     """LangGraph node that sends the search queries to the web research node.
 
     This is used to spawn n number of web research nodes, one for each search query.
+    No branches are started once the run's deadline has passed.
     """
+    check_deadline(
+        state.get("run_deadline"),
+        get_run_id(state),
+        "web_research",
+        len(state["query_list"]),
+    )
     return [
-        Send("web_research", {"search_query": search_query, "id": int(idx)})
+        Send(
+            "web_research",
+            {
+                "search_query": search_query,
+                "id": int(idx),
+                "run_id": state["run_id"],
+                "run_deadline": state.get("run_deadline"),
+            },
+        )
         for idx, search_query in enumerate(state["query_list"])
     ]
 
 
-def web_research(state: WebSearchState, config: RunnableConfig) -> OverallState:
+async def web_research(state: WebSearchState, config: RunnableConfig) -> OverallState:
     """LangGraph node that performs web research using the native Google Search API tool.
 
     Executes a web search using the native Google Search API tool in combination with Gemini 2.0 Flash.
@@ -106,19 +175,25 @@ def web_research(state: WebSearchState, config: RunnableConfig) -> OverallState:
     """
     # Configure
     configurable = Configuration.from_runnable_config(config)
+    run_id = get_run_id(state)
     formatted_prompt = web_searcher_instructions.format(
         current_date=get_current_date(),
         research_topic=state["search_query"],
     )
 
     # Uses the google genai client as the langchain client doesn't return grounding metadata
-    response = genai_client.models.generate_content(
-        model=configurable.query_generator_model,
-        contents=formatted_prompt,
-        config={
-            "tools": [{"google_search": {}}],
-            "temperature": 0,
-        },
+    response = await cancellable(
+        genai_client.aio.models.generate_content(
+            model=configurable.query_generator_model,
+            contents=formatted_prompt,
+            config={
+                "tools": [{"google_search": {}}],
+                "temperature": 0,
+            },
+        ),
+        run_id,
+        "web_research",
+        state.get("run_deadline"),
     )
     # resolve the urls to short urls for saving tokens and time
     resolved_urls = resolve_urls(
@@ -136,7 +211,7 @@ def web_research(state: WebSearchState, config: RunnableConfig) -> OverallState:
     }
 
 
-def reflection(state: OverallState, config: RunnableConfig) -> ReflectionState:
+async def reflection(state: OverallState, config: RunnableConfig) -> ReflectionState:
     """LangGraph node that identifies knowledge gaps and generates potential follow-up queries.
 
     Analyzes the current summary to identify areas for further research and generates
@@ -151,25 +226,133 @@ def reflection(state: OverallState, config: RunnableConfig) -> ReflectionState:
         Dictionary with state update, including search_query key containing the generated follow-up query
     """
     configurable = Configuration.from_runnable_config(config)
+    run_id = get_run_id(state)
     # Increment the research loop count and get the reasoning model
     state["research_loop_count"] = state.get("research_loop_count", 0) + 1
     reasoning_model = state.get("reasoning_model") or configurable.reasoning_model
 
-    # Format the prompt
+    # Format the prompt, it starts with the research context shared with finalize_answer
     current_date = get_current_date()
-    formatted_prompt = reflection_instructions.format(
-        current_date=current_date,
-        research_topic=get_research_topic(state["messages"]),
-        summaries="\n\n---\n\n".join(state["web_research_result"]),
+    research_topic = state.get("research_topic") or get_research_topic(
+        state["messages"]
     )
-    # init Reasoning Model
-    llm = ChatGoogleGenerativeAI(
-        model=reasoning_model,
-        temperature=1.0,
-        max_retries=2,
-        api_key=os.getenv("GEMINI_API_KEY"),
+    summaries = "\n\n---\n\n".join(state["web_research_result"])
+    research_context = research_context_prompt.format(
+        research_topic=research_topic, summaries=summaries
+    )
+    formatted_prompt = reflection_instructions.format(
+        current_date=current_date, research_topic=research_topic, summaries=summaries
     )
-    result = llm.with_structured_output(Reflection).invoke(formatted_prompt)
+
+    # Explicit caching only pays off when the context is read more than once: by the
+    # last reflection and finalize_answer, or by reflection and a speculative answer.
+    # Other loops rely on implicit caching of the stable prompt prefix instead of
+    # paying for creating and storing a cache that is read a single time.
+    max_research_loops = get_max_research_loops(state, configurable)
+    cache_name, cache_summary_count = None, 0
+    context_cache = context_caches.get(configurable.context_cache)
+    if context_cache is not None and (
+        configurable.speculative_finalize
+        or state["research_loop_count"] >= max_research_loops
+    ):
+        cache_name, cache_summary_count = await refresh_context_cache(
+            context_cache,
+            state.get("context_cache_name"),
+            state.get("context_cache_summary_count"),
+            model=reasoning_model,
+            context=research_context,
+            summary_count=len(state["web_research_result"]),
+            ttl_seconds=configurable.context_cache_ttl_seconds,
+        )
+    answer_state = {
+        **state,
+        "context_cache_name": cache_name,
+        "context_cache_summary_count": cache_summary_count,
+    }
+
+    # Speculatively generate the final answer while reflecting on the same summaries
+    speculative_task = None
+    if configurable.speculative_finalize:
+        # Input tokens it wastes if discarded early, only the suffix is sent with a cache
+        answer_prompt = format_answer_prompt(answer_state)
+        if cache_name:
+            answer_prompt = answer_prompt[len(research_context) :]
+        speculative_prompt_tokens = len(answer_prompt) // CHARS_PER_TOKEN
+        speculative_task = start_speculative_answer(
+            generate_answer(answer_state, config, speculative=True)
+        )
+
+    try:
+        result = None
+        if cache_name:
+            # Only the instructions following the cached context are sent
+            response = await cancellable(
+                context_cache.generate(
+                    reasoning_model,
+                    cache_name,
+                    formatted_prompt[len(research_context) :],
+                    config={
+                        "temperature": 1.0,
+                        "response_mime_type": "application/json",
+                        "response_schema": Reflection,
+                    },
+                ),
+                run_id,
+                "reflection",
+                state.get("run_deadline"),
+            )
+            # None if the output couldn't be parsed, retried without the cache below
+            result = response.parsed
+        if result is None:
+            # init Reasoning Model
+            llm = ChatGoogleGenerativeAI(
+                model=reasoning_model,
+                temperature=1.0,
+                max_retries=2,
+                api_key=os.getenv("GEMINI_API_KEY"),
+            )
+            result = await cancellable(
+                llm.with_structured_output(Reflection).ainvoke(formatted_prompt),
+                run_id,
+                "reflection",
+                state.get("run_deadline"),
+            )
+        research_done = (
+            result.is_sufficient or state["research_loop_count"] >= max_research_loops
+        )
+
+        # Commit the speculative answer if the research is done, discard it otherwise
+        speculative_answer = None
+        speculation = state.get("speculation")
+        if speculative_task is not None:
+            if research_done:
+                speculative_answer, wasted_tokens = await commit_speculative_answer(
+                    speculative_task, speculative_prompt_tokens
+                )
+            else:
+                wasted_tokens = await discard_speculative_answer(
+                    speculative_task, speculative_prompt_tokens
+                )
+            speculative_task = None
+            # The latest outcome, with the tokens wasted over all loops of this run
+            speculation = {
+                "outcome": "discarded" if speculative_answer is None else "committed",
+                "wasted_tokens": (speculation or {}).get("wasted_tokens", 0)
+                + wasted_tokens,
+            }
+    except BaseException:
+        if speculative_task is not None:
+            await discard_speculative_answer(
+                speculative_task, speculative_prompt_tokens
+            )
+        if cache_name:
+            await context_cache.delete(cache_name)
+        raise
+
+    if cache_name and not research_done:
+        # The next loop reflects on more summaries, this context isn't read again
+        await context_cache.delete(cache_name)
+        cache_name, cache_summary_count = None, 0
 
     return {
         "is_sufficient": result.is_sufficient,
@@ -177,9 +360,22 @@ def reflection(state: OverallState, config: RunnableConfig) -> ReflectionState:
         "follow_up_queries": result.follow_up_queries,
         "research_loop_count": state["research_loop_count"],
         "number_of_ran_queries": len(state["search_query"]),
+        "context_cache_name": cache_name,
+        "context_cache_summary_count": cache_summary_count,
+        "speculative_answer": speculative_answer,
+        "speculation": speculation,
     }
 
 
+def get_max_research_loops(state: OverallState, configurable: Configuration) -> int:
+    """Get the maximum number of research loops, preferring the one set in the state."""
+    return (
+        state.get("max_research_loops")
+        if state.get("max_research_loops") is not None
+        else configurable.max_research_loops
+    )
+
+
 def evaluate_research(
     state: ReflectionState,
     config: RunnableConfig,
@@ -197,49 +393,88 @@ def evaluate_research(
         String literal indicating the next node to visit ("web_research" or "finalize_summary")
     """
     configurable = Configuration.from_runnable_config(config)
-    max_research_loops = (
-        state.get("max_research_loops")
-        if state.get("max_research_loops") is not None
-        else configurable.max_research_loops
-    )
+    max_research_loops = get_max_research_loops(state, configurable)
     if state["is_sufficient"] or state["research_loop_count"] >= max_research_loops:
         return "finalize_answer"
     else:
+        # No more research is started once the run's deadline has passed
+        check_deadline(
+            state.get("run_deadline"),
+            get_run_id(state),
+            "web_research",
+            len(state["follow_up_queries"]),
+        )
         return [
             Send(
                 "web_research",
                 {
                     "search_query": follow_up_query,
                     "id": state["number_of_ran_queries"] + int(idx),
+                    "run_id": state["run_id"],
+                    "run_deadline": state.get("run_deadline"),
                 },
             )
             for idx, follow_up_query in enumerate(state["follow_up_queries"])
         ]
 
 
-def finalize_answer(state: OverallState, config: RunnableConfig):
-    """LangGraph node that finalizes the research summary.
+def format_answer_prompt(state: OverallState) -> str:
+    """Format the prompt of the final answer for the current research summaries."""
+    return answer_instructions.format(
+        current_date=get_current_date(),
+        research_topic=state.get("research_topic")
+        or get_research_topic(state["messages"]),
+        summaries="\n\n---\n\n".join(state["web_research_result"]),
+    )
 
-    Prepares the final output by deduplicating and formatting sources, then
-    combining them with the running summary to create a well-structured
-    research report with proper citations.
 
-    Args:
-        state: Current graph state containing the running summary and sources gathered
+async def generate_answer(
+    state: OverallState, config: RunnableConfig, speculative: bool = False
+) -> Tuple[str, int]:
+    """Generate the final answer with the reasoning model.
+
+    Used by finalize_answer, or by reflection when the answer is generated speculatively.
+    Speculative calls are accounted separately, cancelling them doesn't abort the
+    run, and their tokens aren't streamed since the answer may be discarded.
 
     Returns:
-        Dictionary with state update, including running_summary key containing the formatted final summary with sources
+        Tuple of the answer and the number of tokens used to generate it
     """
     configurable = Configuration.from_runnable_config(config)
+    run_id = get_run_id(state)
+    node = "speculative_finalize_answer" if speculative else "finalize_answer"
     reasoning_model = state.get("reasoning_model") or configurable.reasoning_model
 
-    # Format the prompt
-    current_date = get_current_date()
-    formatted_prompt = answer_instructions.format(
-        current_date=current_date,
-        research_topic=get_research_topic(state["messages"]),
-        summaries="\n---\n\n".join(state["web_research_result"]),
-    )
+    # Format the prompt, it starts with the research context shared with reflection
+    formatted_prompt = format_answer_prompt(state)
+
+    context_cache = context_caches.get(configurable.context_cache)
+    cache_name = state.get("context_cache_name")
+    if context_cache is not None and cache_name:
+        # The cached context holds the first summaries, send everything after them
+        cached_context = research_context_prompt.format(
+            research_topic=state.get("research_topic")
+            or get_research_topic(state["messages"]),
+            summaries="\n\n---\n\n".join(
+                state["web_research_result"][
+                    : state.get("context_cache_summary_count", 0)
+                ]
+            ),
+        )
+        response = await cancellable(
+            context_cache.generate(
+                reasoning_model,
+                cache_name,
+                formatted_prompt[len(cached_context) :],
+                config={"temperature": 0},
+            ),
+            run_id,
+            node,
+            state.get("run_deadline"),
+            aborts_run=not speculative,
+        )
+        usage = response.usage_metadata
+        return response.text, (usage.total_token_count or 0) if usage else 0
 
     # init Reasoning Model, default to Gemini 2.5 Flash
     llm = ChatGoogleGenerativeAI(
@@ -248,20 +483,63 @@ def finalize_answer(state: OverallState, config: RunnableConfig):
         max_retries=2,
         api_key=os.getenv("GEMINI_API_KEY"),
     )
-    result = llm.invoke(formatted_prompt)
+    result = await cancellable(
+        llm.ainvoke(
+            formatted_prompt, config={"tags": [TAG_NOSTREAM]} if speculative else None
+        ),
+        run_id,
+        node,
+        state.get("run_deadline"),
+        aborts_run=not speculative,
+    )
+    usage = result.usage_metadata
+    return result.content, usage["total_tokens"] if usage else 0
+
+
+async def finalize_answer(state: OverallState, config: RunnableConfig):
+    """LangGraph node that finalizes the research summary.
+
+    Prepares the final output by deduplicating and formatting sources, then
+    combining them with the running summary to create a well-structured
+    research report with proper citations. An answer generated speculatively
+    during reflection is used as-is.
+
+    Args:
+        state: Current graph state containing the running summary and sources gathered
+
+    Returns:
+        Dictionary with state update, including running_summary key containing the formatted final summary with sources
+    """
+    configurable = Configuration.from_runnable_config(config)
+    run_id = get_run_id(state)
+
+    answer = state.get("speculative_answer")
+    try:
+        if answer is None:
+            # Nothing else is started once the run's deadline has passed, but an
+            # answer committed by reflection is already paid for and is kept
+            check_deadline(state.get("run_deadline"), run_id, "finalize_answer")
+            answer, _ = await generate_answer(state, config)
+    finally:
+        # The research context is not needed past the final answer
+        context_cache = context_caches.get(configurable.context_cache)
+        if context_cache is not None and state.get("context_cache_name"):
+            await context_cache.delete(state["context_cache_name"])
 
     # Replace the short urls with the original urls and add all used urls to the sources_gathered
     unique_sources = []
     for source in state["sources_gathered"]:
-        if source["short_url"] in result.content:
-            result.content = result.content.replace(
-                source["short_url"], source["value"]
-            )
+        if source["short_url"] in answer:
+            answer = answer.replace(source["short_url"], source["value"])
             unique_sources.append(source)
 
     return {
-        "messages": [AIMessage(content=result.content)],
+        "messages": [AIMessage(content=answer)],
         "sources_gathered": unique_sources,
+        "context_cache_name": None,
+        "context_cache_summary_count": 0,
+        "speculative_answer": None,
+        "call_accounting": finish_run_accounting(run_id),
     }
 
 
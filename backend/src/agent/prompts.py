@@ -14,7 +14,7 @@ Instructions:
 - Don't produce more than {number_queries} queries.
 - Queries should be diverse, if the topic is broad, generate more than 1 query.
 - Don't generate multiple similar queries, 1 is enough.
-- Query should ensure that the most current information is gathered. The current date is {current_date}.
+- Query should ensure that the most current information is gathered.
 
 Format: 
 - Format your response as a JSON object with ALL three of these exact keys:
@@ -31,13 +31,15 @@ Topic: What revenue grew more last year apple stock or the number of people buyi
 }}
 ```
 
-Context: {research_topic}"""
+Context: {research_topic}
 
+The current date is {current_date}."""
 
-web_searcher_instructions = """Conduct targeted Google Searches to gather the most recent, credible information on "{research_topic}" and synthesize it into a verifiable text artifact.
+
+web_searcher_instructions = """Conduct targeted Google Searches to gather the most recent, credible information on the research topic below and synthesize it into a verifiable text artifact.
 
 Instructions:
-- Query should ensure that the most current information is gathered. The current date is {current_date}.
+- Query should ensure that the most current information is gathered.
 - Conduct multiple, diverse searches to gather comprehensive information.
 - Consolidate key findings while meticulously tracking the source(s) for each specific piece of information.
 - The output should be a well-written summary or report based on your search findings. 
@@ -45,9 +47,25 @@ Instructions:
 
 Research Topic:
 {research_topic}
+
+The current date is {current_date}.
+"""
+
+# Shared prefix of the reflection and answer prompts. It only contains static
+# instructions and accumulated content, so it can be cached between the calls.
+research_context_prompt = """You are an expert research assistant taking part in a multi-step web research process. Below are the user's question and the summaries gathered by the previous research steps.
+
+User Context:
+{research_topic}
+
+Summaries:
+{summaries}
 """
 
-reflection_instructions = """You are an expert research assistant analyzing summaries about "{research_topic}".
+reflection_instructions = (
+    research_context_prompt
+    + """
+Your task is to analyze the summaries above.
 
 Instructions:
 - Identify knowledge gaps or areas that need deeper exploration and generate a follow-up query. (1 or multiple).
@@ -73,24 +91,22 @@ Example:
 }}
 ```
 
-Reflect carefully on the Summaries to identify knowledge gaps and produce a follow-up query. Then, produce your output following this JSON format:
+The current date is {current_date}.
 
-Summaries:
-{summaries}
-"""
+Reflect carefully on the Summaries to identify knowledge gaps and produce a follow-up query. Then, produce your output following the JSON format described above."""
+)
 
-answer_instructions = """Generate a high-quality answer to the user's question based on the provided summaries.
+answer_instructions = (
+    research_context_prompt
+    + """
+Your task is to generate a high-quality answer to the user's question based on the summaries above.
 
 Instructions:
-- The current date is {current_date}.
 - You are the final step of a multi-step research process, don't mention that you are the final step. 
 - You have access to all the information gathered from the previous steps.
 - You have access to the user's question.
 - Generate a high-quality answer to the user's question based on the provided summaries and the user's question.
 - you MUST include all the citations from the summaries in the answer correctly.
-
-User Context:
-- {research_topic}
-
-Summaries:
-{summaries}"""
+- The current date is {current_date}.
+"""
+)
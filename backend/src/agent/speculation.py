@@ -0,0 +1,89 @@
+import asyncio
+import logging
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SpeculationStats:
+    """Outcomes of the final answers generated speculatively alongside reflection."""
+
+    started: int = 0
+    committed: int = 0
+    discarded: int = 0
+    # Tokens spent on discarded answers, only input tokens are estimated for answers
+    # cancelled in flight
+    wasted_tokens: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """Share of the finished speculative answers that were committed."""
+        finished = self.committed + self.discarded
+        return self.committed / finished if finished else 0.0
+
+
+# Statistics across all runs of this process, for logs and metrics
+speculation_stats = SpeculationStats()
+
+
+def get_speculation_stats() -> Dict[str, Any]:
+    """Get the speculation statistics of this process, including the hit rate."""
+    return {**asdict(speculation_stats), "hit_rate": speculation_stats.hit_rate}
+
+
+def start_speculative_answer(coro) -> "asyncio.Task[Tuple[str, int]]":
+    """Start generating the final answer in the background."""
+    speculation_stats.started += 1
+    return asyncio.create_task(coro)
+
+
+async def commit_speculative_answer(
+    task: "asyncio.Task[Tuple[str, int]]", prompt_tokens: int
+) -> Tuple[Optional[str], int]:
+    """Wait for the speculative answer and return it.
+
+    If generating the answer failed, it is discarded instead and finalize_answer
+    generates the answer itself.
+
+    Returns:
+        Tuple of the answer (None if it failed) and the number of tokens it wasted
+    """
+    try:
+        answer, _ = await task
+    except Exception:
+        logger.warning("Speculative answer failed", exc_info=True)
+        return None, await discard_speculative_answer(task, prompt_tokens)
+    speculation_stats.committed += 1
+    logger.info(
+        "Committed speculative answer, hit rate %.2f", speculation_stats.hit_rate
+    )
+    return answer, 0
+
+
+async def discard_speculative_answer(
+    task: "asyncio.Task[Tuple[str, int]]", prompt_tokens: int
+) -> int:
+    """Cancel the speculative answer and return the number of tokens it wasted.
+
+    An answer that already finished wasted all of its tokens. For one cancelled in
+    flight this is an estimate of its input tokens only, from prompt_tokens.
+    """
+    if task.done() and not task.cancelled() and task.exception() is None:
+        wasted_tokens = task.result()[1]
+    else:
+        task.cancel()
+        await asyncio.wait([task])
+        if not task.cancelled():
+            # Consume the error of a failed answer, it is discarded anyway
+            task.exception()
+        wasted_tokens = prompt_tokens
+    speculation_stats.discarded += 1
+    speculation_stats.wasted_tokens += wasted_tokens
+    logger.info(
+        "Discarded speculative answer wasting %d tokens, hit rate %.2f",
+        wasted_tokens,
+        speculation_stats.hit_rate,
+    )
+    return wasted_tokens
@@ -21,6 +21,17 @@ class OverallState(TypedDict):
     max_research_loops: int
     research_loop_count: int
     reasoning_model: str
+    research_topic: str
+    conversation_summary: str
+    summarized_message_count: int
+    summarized_message_fingerprint: str
+    context_cache_name: str
+    context_cache_summary_count: int
+    run_id: str
+    run_deadline: float
+    call_accounting: dict
+    speculative_answer: str
+    speculation: dict
 
 
 class ReflectionState(TypedDict):
@@ -43,6 +54,8 @@ class QueryGenerationState(TypedDict):
 class WebSearchState(TypedDict):
     search_query: str
     id: str
+    run_id: str
+    run_deadline: float
 
 
 @dataclass(kw_only=True)
@@ -1,6 +1,16 @@
-from typing import Any, Dict, List
+import hashlib
+import re
+from typing import Any, Dict, List, Optional
 from langchain_core.messages import AnyMessage, AIMessage, HumanMessage
 
+# Rough characters-per-token ratio used to turn token budgets into string lengths
+CHARS_PER_TOKEN = 4
+
+# Markdown citation links such as " [label](https://...)" added by the research nodes
+_CITATION_PATTERN = re.compile(r"\s?\[[^\]]*\]\([^)]*\)")
+_SENTENCE_END_PATTERN = re.compile(r"(?<=[.!?])\s+")
+_LIST_ITEM_PATTERN = re.compile(r"^(?:[-*+]|\d+[.)])\s+")
+
 
 def get_research_topic(messages: List[AnyMessage]) -> str:
     """
@@ -19,6 +29,154 @@ def get_research_topic(messages: List[AnyMessage]) -> str:
     return research_topic
 
 
+def _truncate(text: str, max_chars: int) -> str:
+    """
+    Truncate a string to at most max_chars characters, marking the cut with an ellipsis.
+    """
+    if len(text) <= max_chars:
+        return text
+    return text[: max(max_chars - 3, 0)].rstrip() + "..."
+
+
+def get_key_findings(content: str, max_chars: int) -> str:
+    """
+    Reduce an assistant report to its key findings.
+
+    Citation links are dropped, list items are kept as-is and paragraphs are reduced
+    to their first sentence, until max_chars characters have been collected.
+    """
+    findings = []
+    length = 0
+    for line in _CITATION_PATTERN.sub("", content).splitlines():
+        line = line.strip().lstrip("#>").strip()
+        if not line:
+            continue
+        if _LIST_ITEM_PATTERN.match(line):
+            finding = _LIST_ITEM_PATTERN.sub("", line)
+        else:
+            finding = _SENTENCE_END_PATTERN.split(line, maxsplit=1)[0]
+        finding = finding.replace("**", "").strip()
+        if not finding or finding in findings:
+            continue
+        if length + len(finding) > max_chars:
+            if not findings:
+                findings.append(_truncate(finding, max_chars))
+            break
+        findings.append(finding)
+        length += len(finding) + 2
+    return "; ".join(findings)
+
+
+def _format_turn(message: AnyMessage, max_chars: int) -> Optional[str]:
+    """
+    Format a single conversation turn, reducing assistant reports to their key findings.
+    """
+    if isinstance(message, HumanMessage):
+        return f"User: {_truncate(message.text, max_chars)}"
+    elif isinstance(message, AIMessage):
+        return f"Assistant: {get_key_findings(message.text, max_chars)}"
+    return None
+
+
+def get_message_fingerprint(message: AnyMessage) -> str:
+    """
+    Identify a message by its id, or by a hash of its content if it has none.
+    """
+    if message.id:
+        return f"id:{message.id}"
+    content = message.text.encode("utf-8")
+    return f"sha1:{hashlib.sha1(content).hexdigest()}"
+
+
+def update_research_topic(
+    messages: List[AnyMessage],
+    conversation_summary: Optional[str] = None,
+    summarized_message_count: Optional[int] = None,
+    summarized_message_fingerprint: Optional[str] = None,
+    max_tokens: int = 2000,
+    recent_messages: int = 4,
+) -> Dict[str, Any]:
+    """
+    Incrementally build a token-bounded research topic from the messages.
+
+    Messages older than the last `recent_messages` are folded into a running
+    conversation summary which is carried across turns in the graph state, so only
+    messages added since the previous run have to be processed. Recent messages are
+    kept verbatim, except for assistant reports which are reduced to their key
+    findings. The oldest summary lines are dropped first once the topic exceeds
+    `max_tokens`. The summary is rebuilt from scratch when the last message it
+    covers doesn't match `summarized_message_fingerprint`, e.g. because the history
+    was edited.
+
+    Returns:
+        dict: State update with the "research_topic", "conversation_summary",
+              "summarized_message_count" and "summarized_message_fingerprint" keys.
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    # a single question is used verbatim, as in get_research_topic
+    if len(messages) == 1:
+        return {
+            "research_topic": _truncate(messages[-1].text, max_chars),
+            "conversation_summary": "",
+            "summarized_message_count": 0,
+            "summarized_message_fingerprint": None,
+        }
+
+    # The cached summary can only be reused while the history still extends it
+    summary_lines = conversation_summary.splitlines() if conversation_summary else []
+    start = summarized_message_count or 0
+    if start and (
+        start > len(messages) - 1
+        or get_message_fingerprint(messages[start - 1])
+        != summarized_message_fingerprint
+    ):
+        summary_lines, start = [], 0
+
+    # Fold the messages that left the recent window into the summary
+    split = max(len(messages) - max(recent_messages, 1), start)
+    for message in messages[start:split]:
+        line = _format_turn(message, max_chars // 20)
+        if line is not None:
+            summary_lines.append(line)
+
+    # Recent turns share half of the budget, the latest question is always kept verbatim
+    turn_chars = max_chars // (2 * (len(messages) - split))
+    recent_lines = [
+        line
+        for line in (_format_turn(m, turn_chars) for m in messages[split:-1])
+        if line is not None
+    ]
+    question = messages[-1]
+    if isinstance(question, HumanMessage):
+        recent_lines.append(f"User: {question.text}")
+    else:
+        recent_lines.append(_format_turn(question, turn_chars) or "")
+    recent = "\n".join(recent_lines)
+
+    # Drop the oldest summary lines until the topic fits in the budget
+    budget = max_chars - len(recent)
+    while summary_lines and sum(len(line) + 1 for line in summary_lines) > budget:
+        summary_lines.pop(0)
+    conversation_summary = "\n".join(summary_lines)
+
+    if conversation_summary:
+        research_topic = (
+            f"Earlier conversation (summarized):\n{conversation_summary}\n\n"
+            f"Recent conversation:\n{recent}\n"
+        )
+    else:
+        research_topic = f"{recent}\n"
+
+    return {
+        "research_topic": research_topic,
+        "conversation_summary": conversation_summary,
+        "summarized_message_count": split,
+        "summarized_message_fingerprint": get_message_fingerprint(messages[split - 1])
+        if split
+        else None,
+    }
+
+
 def resolve_urls(urls_to_resolve: List[Any], id: int) -> Dict[str, str]:
     """
     Create a map of the vertex ai search urls (very long) to a short url with a unique id for each url.
@@ -0,0 +1,112 @@
+import asyncio
+import importlib
+import os
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+# The agent package builds its Gemini client on import
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
+
+from agent.context_cache import LocalContextCache  # noqa: E402
+from agent.tools_and_schemas import Reflection  # noqa: E402
+
+graph_module = importlib.import_module("agent.graph")
+
+SUMMARIES = ["Spain won Euro 2024 {not a field}.", "The final was in Berlin.", "Third"]
+
+
+class FakeModels:
+    """Stands in for the async Gemini models API.
+
+    Queued responses are returned first, in order, and raised if they are errors.
+    After that, reflection requests get a verdict and answer requests get text.
+    """
+
+    def __init__(
+        self,
+        responses=(),
+        is_sufficient=True,
+        reflection_error=None,
+        answer_error=None,
+        answer_delay=0,
+    ):
+        self.responses = list(responses)
+        self.is_sufficient = is_sufficient
+        self.reflection_error = reflection_error
+        self.answer_error = answer_error
+        self.answer_delay = answer_delay
+        self.requests = []
+
+    async def generate_content(self, model, contents, config):
+        self.requests.append({"model": model, "contents": contents, "config": config})
+        if self.responses:
+            response = self.responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return response
+        if "response_schema" in config:
+            # Let a speculative answer start before reflection finishes
+            await asyncio.sleep(0.01)
+            if self.reflection_error is not None:
+                raise self.reflection_error
+            parsed = Reflection(
+                is_sufficient=self.is_sufficient,
+                knowledge_gap="",
+                follow_up_queries=[] if self.is_sufficient else ["more"],
+            )
+            return SimpleNamespace(parsed=parsed, text="", usage_metadata=None)
+        await asyncio.sleep(self.answer_delay)
+        if self.answer_error is not None:
+            raise self.answer_error
+        return SimpleNamespace(
+            parsed=None,
+            text="Spain won.",
+            usage_metadata=SimpleNamespace(total_token_count=42),
+        )
+
+
+@pytest.fixture
+def local_cache(monkeypatch):
+    """Install a LocalContextCache backed by FakeModels as the "local" cache."""
+
+    def install(*responses, **behaviour):
+        models = FakeModels(responses, **behaviour)
+        cache = LocalContextCache(SimpleNamespace(aio=SimpleNamespace(models=models)))
+        monkeypatch.setitem(graph_module.context_caches, "local", cache)
+        return cache
+
+    return install
+
+
+@pytest.fixture
+def make_state():
+    """Build the graph state of a run on its last research loop."""
+
+    def make(**overrides):
+        state = {
+            "messages": [HumanMessage(content="Who won Euro 2024?", id="h0")],
+            "research_topic": "Who won Euro 2024? {topic}",
+            "web_research_result": list(SUMMARIES),
+            "search_query": ["euro 2024 winner"],
+            "sources_gathered": [],
+            "reasoning_model": "test-model",
+            "run_id": "test-run",
+            "research_loop_count": 0,
+            "max_research_loops": 1,
+        }
+        state.update(overrides)
+        return state
+
+    return make
+
+
+@pytest.fixture
+def make_config():
+    """Build a run config using the local context cache."""
+
+    def make(**configurable):
+        return {"configurable": {"context_cache": "local", **configurable}}
+
+    return make
@@ -0,0 +1,130 @@
+import asyncio
+import logging
+
+import pytest
+
+from agent import cancellation
+from agent.cancellation import (
+    cancellable,
+    check_deadline,
+    create_run_id,
+    finish_run_accounting,
+    get_run_deadline,
+    get_run_id,
+)
+
+
+def test_run_id_comes_from_server_metadata():
+    assert create_run_id({"metadata": {"run_id": "server-run"}}) == "server-run"
+
+
+def test_local_runs_get_distinct_ids():
+    assert create_run_id({}) != create_run_id({})
+
+
+def test_missing_run_id_fails_loudly():
+    with pytest.raises(ValueError):
+        get_run_id({"messages": []})
+
+
+def test_accounting_records_cancelled_and_skipped_calls():
+    async def run():
+        await cancellable(asyncio.sleep(0), "run-1", "generate_query", None)
+        with pytest.raises(TimeoutError):
+            await cancellable(
+                asyncio.sleep(5), "run-1", "web_research", get_run_deadline(0.01)
+            )
+        task = asyncio.create_task(
+            cancellable(asyncio.sleep(5), "run-1", "finalize_answer", None)
+        )
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        with pytest.raises(TimeoutError):
+            check_deadline(get_run_deadline(-1), "run-1", "web_research", pending=2)
+        # Finished before the grace period of the aborted run is over
+        return finish_run_accounting("run-1")
+
+    accounting = asyncio.run(run())
+    assert accounting == {
+        "started": {"generate_query": 1, "web_research": 1, "finalize_answer": 1},
+        "completed": {"generate_query": 1},
+        "cancelled": {"web_research": 1, "finalize_answer": 1},
+        "skipped": {"web_research": 2},
+    }
+
+
+def get_finished_runs(caplog):
+    return {
+        record.run_id: (record.run_outcome, record.call_accounting)
+        for record in caplog.records
+        if hasattr(record, "run_outcome")
+    }
+
+
+def test_cancelled_run_accounting_is_finished(monkeypatch, caplog):
+    monkeypatch.setattr(cancellation, "ABORTED_RUN_GRACE_SECONDS", 0)
+    caplog.set_level(logging.INFO, logger="agent.cancellation")
+
+    async def run():
+        tasks = [
+            asyncio.create_task(
+                cancellable(asyncio.sleep(5), "run-c", "web_research", None)
+            )
+            for _ in range(2)
+        ]
+        await asyncio.sleep(0)
+        for task in tasks:
+            task.cancel()
+        await asyncio.wait(tasks)
+        # Let the scheduled finish run
+        await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+
+    outcome, accounting = get_finished_runs(caplog)["run-c"]
+    assert outcome == "aborted"
+    assert accounting["cancelled"] == {"web_research": 2}
+    assert "run-c" not in cancellation._run_accounting
+
+
+def test_timed_out_run_accounting_is_finished(caplog):
+    caplog.set_level(logging.INFO, logger="agent.cancellation")
+    asyncio.run(cancellable(asyncio.sleep(0), "run-t", "generate_query", None))
+
+    with pytest.raises(TimeoutError):
+        check_deadline(get_run_deadline(-1), "run-t", "web_research", pending=3)
+
+    outcome, accounting = get_finished_runs(caplog)["run-t"]
+    assert outcome == "aborted"
+    assert accounting["completed"] == {"generate_query": 1}
+    assert accounting["skipped"] == {"web_research": 3}
+    assert "run-t" not in cancellation._run_accounting
+
+
+def test_run_is_not_aborted_by_calls_cancelled_on_their_own(monkeypatch):
+    monkeypatch.setattr(cancellation, "ABORTED_RUN_GRACE_SECONDS", 0)
+
+    async def run():
+        task = asyncio.create_task(
+            cancellable(
+                asyncio.sleep(5), "run-s", "speculative", None, aborts_run=False
+            )
+        )
+        await asyncio.sleep(0)
+        task.cancel()
+        await asyncio.wait([task])
+        await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+
+    assert finish_run_accounting("run-s")["cancelled"] == {"speculative": 1}
+
+
+def test_accounting_is_kept_per_run():
+    asyncio.run(cancellable(asyncio.sleep(0), "run-a", "reflection", None))
+    asyncio.run(cancellable(asyncio.sleep(0), "run-b", "reflection", None))
+
+    assert finish_run_accounting("run-a")["completed"] == {"reflection": 1}
+    assert finish_run_accounting("run-b")["completed"] == {"reflection": 1}
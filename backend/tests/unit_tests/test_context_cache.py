@@ -0,0 +1,148 @@
+import asyncio
+import importlib
+from types import SimpleNamespace
+
+import pytest
+from pydantic import ValidationError
+
+from agent.configuration import Configuration
+from agent.prompts import (
+    answer_instructions,
+    reflection_instructions,
+    research_context_prompt,
+)
+from agent.tools_and_schemas import Reflection
+
+graph_module = importlib.import_module("agent.graph")
+
+SEPARATOR = "\n\n---\n\n"
+
+
+def make_response(text="", parsed=None):
+    return SimpleNamespace(text=text, parsed=parsed, usage_metadata=None)
+
+
+class FakeChatModel:
+    """Stands in for ChatGoogleGenerativeAI on the uncached path."""
+
+    prompts = []
+
+    def __init__(self, **kwargs):
+        pass
+
+    def with_structured_output(self, schema):
+        return self
+
+    async def ainvoke(self, prompt):
+        FakeChatModel.prompts.append(prompt)
+        return Reflection(
+            is_sufficient=False, knowledge_gap="gap", follow_up_queries=["more"]
+        )
+
+
+@pytest.fixture
+def fake_chat_model(monkeypatch):
+    FakeChatModel.prompts = []
+    monkeypatch.setattr(graph_module, "ChatGoogleGenerativeAI", FakeChatModel)
+    return FakeChatModel
+
+
+@pytest.mark.parametrize("template", [reflection_instructions, answer_instructions])
+@pytest.mark.parametrize("cached_summaries", [1, 2, 3])
+def test_prompts_start_with_research_context(template, cached_summaries, make_state):
+    state = make_state()
+    summaries = state["web_research_result"]
+    formatted_prompt = template.format(
+        current_date="June 1, 2025",
+        research_topic=state["research_topic"],
+        summaries=SEPARATOR.join(summaries),
+    )
+    cached_context = research_context_prompt.format(
+        research_topic=state["research_topic"],
+        summaries=SEPARATOR.join(summaries[:cached_summaries]),
+    )
+    assert formatted_prompt.startswith(cached_context)
+
+
+def test_reflection_and_finalize_answer_share_cached_context(
+    local_cache, make_state, make_config
+):
+    sufficient = Reflection(is_sufficient=True, knowledge_gap="", follow_up_queries=[])
+    cache = local_cache(
+        make_response(parsed=sufficient), make_response(text="Spain won.")
+    )
+    state = make_state()
+    config = make_config()
+
+    update = asyncio.run(graph_module.reflection(dict(state), config))
+    assert update["is_sufficient"] is True
+    assert update["context_cache_name"] in cache.contexts
+    assert update["context_cache_summary_count"] == len(state["web_research_result"])
+
+    state.update(update)
+    result = asyncio.run(graph_module.finalize_answer(state, config))
+    assert result["messages"][0].content == "Spain won."
+    assert result["call_accounting"]["completed"] == {
+        "reflection": 1,
+        "finalize_answer": 1,
+    }
+    assert cache.contexts == {}
+
+    # The stub sends the cached context followed by the rest of the prompt
+    reflection_request, answer_request = cache.client.aio.models.requests
+    assert reflection_request["contents"] == reflection_instructions.format(
+        current_date=graph_module.get_current_date(),
+        research_topic=state["research_topic"],
+        summaries=SEPARATOR.join(state["web_research_result"]),
+    )
+    assert answer_request["contents"] == graph_module.format_answer_prompt(state)
+
+
+def test_reflection_falls_back_when_cached_output_does_not_parse(
+    local_cache, fake_chat_model, make_state, make_config
+):
+    cache = local_cache(make_response(parsed=None))
+
+    update = asyncio.run(graph_module.reflection(make_state(), make_config()))
+
+    assert update["knowledge_gap"] == "gap"
+    assert len(fake_chat_model.prompts) == 1
+    # The research is done after the last loop, so the cache is kept for the answer
+    assert update["context_cache_name"] in cache.contexts
+
+
+def test_reflection_does_not_cache_context_read_once(
+    local_cache, fake_chat_model, make_state, make_config
+):
+    cache = local_cache()
+
+    update = asyncio.run(
+        graph_module.reflection(make_state(max_research_loops=3), make_config())
+    )
+
+    assert update["context_cache_name"] is None
+    assert cache.contexts == {}
+    assert len(fake_chat_model.prompts) == 1
+
+
+def test_reflection_deletes_cache_on_error(local_cache, make_state, make_config):
+    cache = local_cache(RuntimeError("model unavailable"))
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(graph_module.reflection(make_state(), make_config()))
+
+    assert cache.contexts == {}
+
+
+def test_local_cache_expires_contexts(local_cache):
+    cache = local_cache()
+    cache_name = asyncio.run(cache.create("test-model", "context", ttl_seconds=0))
+
+    with pytest.raises(ValueError):
+        asyncio.run(cache.generate("test-model", cache_name, "prompt", {}))
+    assert cache.contexts == {}
+
+
+def test_invalid_context_cache_setting_is_rejected(make_config):
+    with pytest.raises(ValidationError):
+        Configuration.from_runnable_config(make_config(context_cache="Gemini"))
@@ -0,0 +1,168 @@
+import asyncio
+import importlib
+
+import pytest
+from langchain_core.messages import AIMessage
+
+from agent.speculation import get_speculation_stats
+from agent.utils import CHARS_PER_TOKEN
+
+graph_module = importlib.import_module("agent.graph")
+
+
+def stats_delta(before):
+    after = get_speculation_stats()
+    return {key: after[key] - before[key] for key in before if key != "hit_rate"}
+
+
+def test_speculative_answer_is_committed_when_research_is_sufficient(
+    local_cache, make_state, make_config
+):
+    cache = local_cache(is_sufficient=True)
+    before = get_speculation_stats()
+    state = make_state(run_id="hit")
+    config = make_config(speculative_finalize=True)
+
+    update = asyncio.run(graph_module.reflection(dict(state), config))
+    assert update["speculative_answer"] == "Spain won."
+    assert update["speculation"] == {"outcome": "committed", "wasted_tokens": 0}
+    assert stats_delta(before) == {
+        "started": 1,
+        "committed": 1,
+        "discarded": 0,
+        "wasted_tokens": 0,
+    }
+
+    # finalize_answer uses the committed answer without another model call
+    state.update(update)
+    result = asyncio.run(graph_module.finalize_answer(state, config))
+    assert result["messages"][0].content == "Spain won."
+    assert len(cache.client.aio.models.requests) == 2
+    assert result["call_accounting"]["completed"] == {
+        "reflection": 1,
+        "speculative_finalize_answer": 1,
+    }
+
+
+def test_speculative_answer_is_discarded_when_more_research_is_needed(
+    local_cache, make_state, make_config
+):
+    cache = local_cache(is_sufficient=False, answer_delay=5)
+    before = get_speculation_stats()
+    state = make_state(run_id="miss", max_research_loops=3)
+
+    update = asyncio.run(
+        graph_module.reflection(dict(state), make_config(speculative_finalize=True))
+    )
+
+    assert update["speculative_answer"] is None
+    assert update["context_cache_name"] is None
+    assert cache.contexts == {}
+    # Only the prompt following the cached context was sent
+    _, answer_request = cache.client.aio.models.requests
+    answer_prompt = answer_request["contents"]
+    research_context = graph_module.research_context_prompt.format(
+        research_topic=state["research_topic"],
+        summaries="\n\n---\n\n".join(state["web_research_result"]),
+    )
+    wasted_tokens = (len(answer_prompt) - len(research_context)) // CHARS_PER_TOKEN
+    assert update["speculation"] == {
+        "outcome": "discarded",
+        "wasted_tokens": wasted_tokens,
+    }
+    delta = stats_delta(before)
+    assert delta["discarded"] == 1
+    assert delta["wasted_tokens"] == wasted_tokens
+
+    # The tokens wasted over the run's loops add up
+    state.update(update, speculation={"outcome": "discarded", "wasted_tokens": 10})
+    update = asyncio.run(
+        graph_module.reflection(dict(state), make_config(speculative_finalize=True))
+    )
+    assert update["speculation"]["wasted_tokens"] == 10 + wasted_tokens
+
+    accounting = graph_module.finish_run_accounting("miss")
+    assert accounting["cancelled"] == {"speculative_finalize_answer": 2}
+    assert "finalize_answer" not in accounting["cancelled"]
+
+
+def test_speculative_answer_is_discarded_when_reflection_fails(
+    local_cache, make_state, make_config
+):
+    cache = local_cache(reflection_error=RuntimeError("overloaded"), answer_delay=5)
+    before = get_speculation_stats()
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(
+            graph_module.reflection(
+                make_state(run_id="error"), make_config(speculative_finalize=True)
+            )
+        )
+
+    delta = stats_delta(before)
+    assert delta["started"] == delta["discarded"] == 1
+    assert cache.contexts == {}
+
+
+def test_failed_speculative_answer_falls_back_to_finalize_answer(
+    local_cache, make_state, make_config
+):
+    cache = local_cache(is_sufficient=True, answer_error=RuntimeError("overloaded"))
+    before = get_speculation_stats()
+    state = make_state(run_id="failed")
+    config = make_config(speculative_finalize=True)
+
+    update = asyncio.run(graph_module.reflection(dict(state), config))
+    assert update["is_sufficient"] is True
+    assert update["speculative_answer"] is None
+    assert update["speculation"]["outcome"] == "discarded"
+    delta = stats_delta(before)
+    assert delta["committed"] == 0
+    assert delta["discarded"] == 1
+
+    # finalize_answer generates the answer itself
+    cache.client.aio.models.answer_error = None
+    state.update(update)
+    result = asyncio.run(graph_module.finalize_answer(state, config))
+    assert result["messages"][0].content == "Spain won."
+    assert result["call_accounting"]["completed"] == {
+        "reflection": 1,
+        "finalize_answer": 1,
+    }
+
+
+@pytest.mark.parametrize("speculative", [True, False])
+def test_only_the_final_answer_is_streamed(monkeypatch, make_state, speculative):
+    configs = []
+
+    class FakeChatModel:
+        def __init__(self, **kwargs):
+            pass
+
+        async def ainvoke(self, prompt, config=None):
+            configs.append(config)
+            return AIMessage(content="Spain won.")
+
+    monkeypatch.setattr(graph_module, "ChatGoogleGenerativeAI", FakeChatModel)
+
+    answer, _ = asyncio.run(
+        graph_module.generate_answer(
+            make_state(run_id="stream"), {}, speculative=speculative
+        )
+    )
+
+    assert answer == "Spain won."
+    tags = (configs[0] or {}).get("tags", [])
+    assert ("nostream" in tags) is speculative
+
+
+def test_committed_answer_survives_the_deadline(make_state):
+    state = make_state(
+        run_id="late",
+        run_deadline=0.0,
+        speculative_answer="Spain won.",
+    )
+
+    result = asyncio.run(graph_module.finalize_answer(state, {}))
+
+    assert result["messages"][0].content == "Spain won."
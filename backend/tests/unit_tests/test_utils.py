@@ -0,0 +1,111 @@
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agent.utils import (
+    CHARS_PER_TOKEN,
+    get_key_findings,
+    update_research_topic,
+)
+
+REPORT = """# Euro 2024
+
+Spain won Euro 2024 [bbc](https://vertexaisearch.cloud.google.com/id/0-0). They beat England 2-1 in the final.
+
+- **Spain** now holds a record 4 titles [uefa](https://vertexaisearch.cloud.google.com/id/0-1)
+- The final was played in Berlin
+"""
+
+
+def make_conversation(turns, prefix="question"):
+    messages = []
+    for turn in range(turns):
+        messages.append(
+            HumanMessage(content=f"{prefix} {turn}?", id=f"{prefix}-h{turn}")
+        )
+        messages.append(AIMessage(content=REPORT, id=f"{prefix}-a{turn}"))
+    messages.append(HumanMessage(content=f"{prefix} {turns}?", id=f"{prefix}-h{turns}"))
+    return messages
+
+
+def test_key_findings_drop_citations_and_keep_first_sentences():
+    findings = get_key_findings(REPORT, 1000)
+    assert findings == (
+        "Euro 2024; Spain won Euro 2024.; Spain now holds a record 4 titles; "
+        "The final was played in Berlin"
+    )
+
+
+def test_key_findings_respect_budget():
+    assert get_key_findings(REPORT, 31) == "Euro 2024; Spain won Euro 2024."
+    assert len(get_key_findings("x" * 100, 20)) == 20
+
+
+def test_key_findings_skip_duplicates():
+    assert get_key_findings("- same\n- same\n- other", 100) == "same; other"
+
+
+def test_single_question_is_used_verbatim():
+    update = update_research_topic([HumanMessage(content="Who won Euro 2024?")])
+    assert update["research_topic"] == "Who won Euro 2024?"
+    assert update["summarized_message_count"] == 0
+
+
+def test_topic_stays_bounded_as_conversation_grows():
+    state = {}
+    sizes = []
+    for turns in range(1, 40):
+        state = update_research_topic(
+            make_conversation(turns),
+            conversation_summary=state.get("conversation_summary"),
+            summarized_message_count=state.get("summarized_message_count"),
+            summarized_message_fingerprint=state.get("summarized_message_fingerprint"),
+            max_tokens=200,
+        )
+        sizes.append(len(state["research_topic"]))
+    assert max(sizes) <= 200 * CHARS_PER_TOKEN + 100
+    assert state["research_topic"].endswith("User: question 39?\n")
+    assert "bbc" not in state["research_topic"]
+
+
+def test_summary_is_extended_incrementally():
+    first = update_research_topic(make_conversation(4), recent_messages=2)
+    second = update_research_topic(
+        make_conversation(5),
+        conversation_summary=first["conversation_summary"],
+        summarized_message_count=first["summarized_message_count"],
+        summarized_message_fingerprint=first["summarized_message_fingerprint"],
+        recent_messages=2,
+    )
+    assert second["conversation_summary"].startswith(first["conversation_summary"])
+    assert second["summarized_message_count"] == first["summarized_message_count"] + 2
+
+
+def test_summary_is_rebuilt_when_history_changes():
+    old = update_research_topic(make_conversation(14, prefix="old"))
+    assert "old 10?" in old["conversation_summary"]
+
+    update = update_research_topic(
+        make_conversation(3, prefix="new"),
+        conversation_summary=old["conversation_summary"],
+        summarized_message_count=3,
+        summarized_message_fingerprint=old["summarized_message_fingerprint"],
+    )
+    assert "old " not in update["research_topic"]
+    assert "new 0?" in update["research_topic"]
+
+
+def test_content_block_messages_are_supported():
+    blocks = [{"type": "text", "text": REPORT}]
+    messages = [
+        HumanMessage(content=[{"type": "text", "text": "question " * 2000}]),
+        AIMessage(content=blocks),
+        HumanMessage(content=[{"type": "text", "text": "Who holds the record?"}]),
+    ]
+
+    update = update_research_topic(messages, max_tokens=200, recent_messages=2)
+
+    assert "Assistant: Euro 2024; Spain won Euro 2024." in update["research_topic"]
+    assert update["research_topic"].endswith("User: Who holds the record?\n")
+    assert update["conversation_summary"].startswith("User: question question")
+
+    single = update_research_topic(messages[:1], max_tokens=10)
+    assert len(single["research_topic"]) == 10 * CHARS_PER_TOKEN